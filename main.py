@@ -1,9 +1,75 @@
 import sys
+import argparse
+from collections import Counter
 from utils.file_handler import *
 from utils.api_handler import *
+from utils.spill_aggregator import parse_memory_limit
+from utils.dedup import TransactionDeduplicator
+
+
+def positive_int(text):
+    """
+    argparse type for options that must be a whole number of at least 1.
+    """
+
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {text!r}")
+
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+
+    return value
+
+
+def parse_args(argv=None):
+    """
+    Parses command line options.
+    """
+
+    parser = argparse.ArgumentParser(description="Sales Analytics System")
+    parser.add_argument(
+        "inputs", nargs="*", default=["data/sales_data.txt"],
+        help="Sales files, directories, glob patterns or manifest files "
+             "(.manifest/.lst). Compressed .gz/.zst shards are supported."
+    )
+    parser.add_argument(
+        "--workers", type=positive_int, default=4,
+        help="Number of shards read concurrently (default: 4)"
+    )
+    parser.add_argument(
+        "--quarantine-file", default=None,
+        help="Write rejected rows with line number and reason code to this file"
+    )
+    parser.add_argument(
+        "--report-format", choices=("json", "csv"), default=None,
+        help="Also write the report data as JSON or CSV next to the text report"
+    )
+    parser.add_argument(
+        "--rolling-window", type=positive_int, default=None, metavar="DAYS",
+        help="Add a rolling sales section (e.g. 7 or 30 days) to the report"
+    )
+    parser.add_argument(
+        "--basket-top-k", type=positive_int, default=None, metavar="K",
+        help="Add the top K product pairs bought together (market basket) to the report"
+    )
+    parser.add_argument(
+        "--memory-limit", type=parse_memory_limit, default=None, metavar="SIZE",
+        help="Memory budget for per-customer/per-date aggregation, e.g. 512M or 2G; "
+             "state beyond it is spilled to temporary files"
+    )
+    parser.add_argument(
+        "--dedup-state", default=None, metavar="DIR",
+        help="Directory holding TransactionIDs of previous runs; rows already "
+             "processed in an earlier run are skipped as duplicates"
+    )
+    return parser.parse_args(argv)
 
 
 def main():
+    args = parse_args()
+
     print("========================================")
     print("        SALES ANALYTICS SYSTEM")
     print("========================================\n")
@@ -13,14 +79,23 @@ def main():
         # [1/10] READ SALES DATA
         # -----------------------------------------------------------
         print("[1/10] Reading sales data...")
-        raw_lines = read_sales_data("data/sales_data.txt")
+        raw_lines = read_sales_files(
+            args.inputs,
+            workers=args.workers,
+            with_line_numbers=True
+        )
         print(f"✓ Successfully read {len(raw_lines)} raw lines\n")
 
+        if not raw_lines:
+            print("No sales data to process.")
+            return
+
         # -----------------------------------------------------------
         # [2/10] PARSE TRANSACTIONS
         # -----------------------------------------------------------
         print("[2/10] Parsing and cleaning data...")
-        transactions = parse_transactions(raw_lines)
+        quarantine = QuarantineSink(args.quarantine_file)
+        transactions = parse_transactions(raw_lines, quarantine=quarantine)
         print(f"✓ Parsed {len(transactions)} records\n")
 
         # -----------------------------------------------------------
@@ -33,8 +108,8 @@ def main():
         print("Regions:", ", ".join(all_regions))
 
         # Determine amount range
-        amounts = [tx["Quantity"] * tx["UnitPrice"] for tx in transactions]
-        print(f"Amount Range: ₹{min(amounts):,.0f} - ₹{max(amounts):,.0f}\n")
+        amounts = [tx_amount_paise(tx) for tx in transactions]
+        print(f"Amount Range: {format_inr(min(amounts), 0)} - {format_inr(max(amounts), 0)}\n")
 
         # User chooses to filter or not
         choice = input("Do you want to filter data? (y/n): ").strip().lower()
@@ -54,6 +129,11 @@ def main():
 
                 max_amt = input("Maximum amount (or press Enter to skip): ").strip()
                 max_amt = float(max_amt) if max_amt else None
+
+                # Bounds must be valid money amounts (rejects inf/nan)
+                for bound in (min_amt, max_amt):
+                    if bound is not None:
+                        to_paise(bound)
             except:
                 print("Invalid amount entered. Filters ignored.\n")
                 min_amt, max_amt = None, None
@@ -63,14 +143,35 @@ def main():
         # [4/10] VALIDATE + FILTER
         # -----------------------------------------------------------
         print("[4/10] Validating transactions...")
+        deduplicator = TransactionDeduplicator(args.dedup_state)
         valid_tx, invalid_count, filter_summary = validate_and_filter(
             transactions,
             region=region_filter,
             min_amount=min_amt,
-            max_amount=max_amt
+            max_amount=max_amt,
+            quarantine=quarantine,
+            deduplicator=deduplicator
+        )
+        quarantine.close()
+
+        print(
+            f"✓ Valid: {len(valid_tx)} | Invalid: {invalid_count} "
+            f"| Duplicates: {filter_summary['duplicates']}"
         )
+        print(f"✓ Unparseable rows: {filter_summary['parse_rejected']}")
+        rejected = Counter(filter_summary["parse_rejected_by_reason"])
+        rejected.update(filter_summary["rejected_by_reason"])
+        for reason, count in sorted(rejected.items()):
+            print(f"  - {reason}: {count}")
+        if args.quarantine_file:
+            print(f"✓ Rejected rows saved to: {args.quarantine_file}")
+        print()
 
-        print(f"✓ Valid: {len(valid_tx)} | Invalid: {invalid_count}\n")
+        # e.g. a rerun over already processed shards with --dedup-state
+        if not valid_tx:
+            deduplicator.close()
+            print("No new transactions to process.")
+            return
 
         # -----------------------------------------------------------
         # [5/10] ANALYZE SALES DATA
@@ -80,8 +181,8 @@ def main():
         _ = calculate_total_revenue(valid_tx)
         _ = region_wise_sales(valid_tx)
         _ = top_selling_products(valid_tx)
-        _ = customer_analysis(valid_tx)
-        _ = daily_sales_trend(valid_tx)
+        # Customer and daily aggregations (the high-cardinality ones, which
+        # may spill under --memory-limit) are computed once, by the report
         _ = find_peak_sales_day(valid_tx)
         _ = low_performing_products(valid_tx)
         print("✓ Analysis complete\n")
@@ -115,9 +216,19 @@ def main():
         # [9/10] GENERATE REPORT
         # -----------------------------------------------------------
         print("[9/10] Generating report...")
-        generate_sales_report(valid_tx, enriched)
+        generate_sales_report(valid_tx, enriched, data_format=args.report_format,
+                              rolling_window=args.rolling_window,
+                              basket_top_k=args.basket_top_k,
+                              memory_limit=args.memory_limit)
         print("✓ Report saved to: output/sales_report.txt\n")
 
+        # Remember transaction IDs only after a successful run
+        overlapping = deduplicator.commit()
+        deduplicator.close()
+        if overlapping:
+            print(f"Warning: {overlapping} transaction ID(s) were also committed by a "
+                  f"concurrent run over the same dedup state.\n")
+
         # -----------------------------------------------------------
         # [10/10] COMPLETE
         # -----------------------------------------------------------
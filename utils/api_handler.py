@@ -1,7 +1,12 @@
 import requests
+import csv
 import datetime
+import json
 import os
 from utils.data_processor import *
+from utils.money import format_inr
+from utils.window_analytics import *
+from utils.market_basket import *
 
 def fetch_all_products():
     """
@@ -121,172 +126,428 @@ def save_enriched_data(enriched_transactions, filename="data/enriched_sales_data
             f.write("|".join(row) + "\n")
 
 
-def generate_sales_report(
-    transactions,
-    enriched_transactions,
-    output_file="output/sales_report.txt"
-):
+def _report_sections(transactions, enriched_transactions, rolling_window=None,
+                     basket_top_k=None, memory_limit=None):
     """
-    Generates a comprehensive formatted sales report.
-    Includes all 8 required sections in the correct order.
+    Yields (section_name, data) for each report section, in report order.
+    Rolling-window sections are only included when rolling_window is set,
+    and the product affinity section only when basket_top_k is set.
+    memory_limit (bytes) is passed on to the per-customer/per-date aggregators.
+    Sections are computed lazily so each can be written before the next one.
+    Money values are integer paise (keys ending in _paise).
     """
 
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-    report = []
-
     # -----------------------------------------------------------
     # 1. HEADER
     # -----------------------------------------------------------
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     total_records = len(transactions)
 
-    report.append("==============================================")
-    report.append("             SALES ANALYTICS REPORT           ")
-    report.append("==============================================")
-    report.append(f"Generated: {now}")
-    report.append(f"Records Processed: {total_records}")
-    report.append("==============================================\n")
+    yield "header", {
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "records_processed": total_records,
+    }
 
     # -----------------------------------------------------------
     # 2. OVERALL SUMMARY
     # -----------------------------------------------------------
     total_revenue = calculate_total_revenue(transactions)
-    avg_order_value = total_revenue / total_records if total_records else 0
-
-    dates = sorted([t["Date"] for t in transactions])
-    date_range = f"{dates[0]} to {dates[-1]}"
+    dates = [t["Date"] for t in transactions]
 
-    report.append("OVERALL SUMMARY")
-    report.append("----------------------------------------------")
-    report.append(f"Total Revenue: ₹{total_revenue:,.2f}")
-    report.append(f"Total Transactions: {total_records}")
-    report.append(f"Average Order Value: ₹{avg_order_value:,.2f}")
-    report.append(f"Date Range: {date_range}\n")
+    yield "overall_summary", {
+        "total_revenue_paise": total_revenue,
+        "total_transactions": total_records,
+        "avg_order_value_paise": divide_paise(total_revenue, total_records),
+        "first_date": min(dates) if dates else None,
+        "last_date": max(dates) if dates else None,
+    }
 
     # -----------------------------------------------------------
     # 3. REGION-WISE PERFORMANCE
     # -----------------------------------------------------------
-    region_stats = region_wise_sales(transactions)
-
-    report.append("REGION-WISE PERFORMANCE")
-    report.append("----------------------------------------------")
-    report.append(f"{'Region':10} {'Sales':15} {'% of Total':15} {'Transactions'}")
-
-    for region, stats in region_stats.items():
-        report.append(
-            f"{region:10} "
-            f"₹{stats['total_sales']:,.0f}   "
-            f"{stats['percentage']:.2f}%        "
-            f"{stats['transaction_count']}"
-        )
-    report.append("")
+    yield "region_performance", {
+        region: {
+            "total_sales_paise": stats["total_sales"],
+            "percentage": stats["percentage"],
+            "transaction_count": stats["transaction_count"],
+        }
+        for region, stats in region_wise_sales(transactions).items()
+    }
 
     # -----------------------------------------------------------
     # 4. TOP 5 PRODUCTS
     # -----------------------------------------------------------
-    top_products = top_selling_products(transactions, n=5)
+    yield "top_products", {
+        name: {"rank": rank, "total_qty": qty, "total_revenue_paise": revenue}
+        for rank, (name, qty, revenue) in enumerate(top_selling_products(transactions, n=5), start=1)
+    }
 
-    report.append("TOP 5 PRODUCTS")
-    report.append("----------------------------------------------")
-    report.append(f"{'Rank':5} {'Product':20} {'Qty Sold':10} {'Revenue'}")
-
-    rank = 1
-    for name, qty, revenue in top_products:
-        report.append(
-            f"{rank:<5} {name:20} {qty:<10} ₹{revenue:,.0f}"
-        )
-        rank += 1
+    # -----------------------------------------------------------
+    # 5. TOP 5 CUSTOMERS (streamed through a heap, no full customer table)
+    # -----------------------------------------------------------
+    customers = top_customers(transactions, n=5, memory_limit=memory_limit)
 
-    report.append("")
+    yield "top_customers", {
+        cid: {
+            "rank": rank,
+            "total_spent_paise": stats["total_spent"],
+            "purchase_count": stats["purchase_count"],
+        }
+        for rank, (cid, stats) in enumerate(customers, start=1)
+    }
 
     # -----------------------------------------------------------
-    # 5. TOP 5 CUSTOMERS
+    # 6. DAILY SALES TREND
     # -----------------------------------------------------------
-    customers = customer_analysis(transactions)
-    sorted_customers = sorted(
-        customers.items(),
-        key=lambda x: x[1]["total_spent"],
-        reverse=True
-    )[:5]
-
-    report.append("TOP 5 CUSTOMERS")
-    report.append("----------------------------------------------")
-    report.append(f"{'Rank':5} {'Customer':10} {'Total Spent':15} {'Orders'}")
-
-    rank = 1
-    for cid, stats in sorted_customers:
-        report.append(
-            f"{rank:<5} {cid:10} ₹{stats['total_spent']:,.0f}       {stats['purchase_count']}"
-        )
-        rank += 1
+    daily_stats = daily_sales_trend(transactions, memory_limit)
 
-    report.append("")
+    yield "daily_sales_trend", {
+        date: {
+            "revenue_paise": stats["revenue"],
+            "transaction_count": stats["transaction_count"],
+            "unique_customers": stats["unique_customers"],
+        }
+        for date, stats in daily_stats.items()
+    }
 
     # -----------------------------------------------------------
-    # 6. DAILY SALES TREND
+    # 6b. ROLLING SALES WINDOW (optional)
     # -----------------------------------------------------------
-    daily_stats = daily_sales_trend(transactions)
-
-    report.append("DAILY SALES TREND")
-    report.append("----------------------------------------------")
-    report.append(f"{'Date':12} {'Revenue':12} {'Transactions':12} {'Unique Customers'}")
-
-    for date, stats in daily_stats.items():
-        report.append(
-            f"{date:12} "
-            f"₹{stats['revenue']:,.0f}      "
-            f"{stats['transaction_count']:10}     "
-            f"{stats['unique_customers']}"
-        )
+    if rolling_window is not None and transactions:
+        peak = find_peak_sales_window(daily_stats, rolling_window) or (None, None, None)
+        undated = undated_sales(daily_stats)
+
+        yield "peak_sales_window", {
+            "window_days": rolling_window,
+            "start_date": peak[0],
+            "end_date": peak[1],
+            "revenue_paise": peak[2],
+            "undated_days": len(undated),
+            "undated_revenue_paise": sum(undated.values()),
+        }
+
+        yield "region_peak_windows", {
+            region: {"start_date": peak[0], "end_date": peak[1], "revenue_paise": peak[2]}
+            for region, peak in region_peak_sales_windows(transactions, rolling_window).items()
+            if peak is not None
+        }
 
-    report.append("")
+        yield "rolling_sales", {
+            date: {
+                "revenue_paise": stats["revenue"],
+                "rolling_revenue_paise": stats["rolling_revenue"],
+                "moving_average_paise": stats["moving_average"],
+                "growth_pct": stats["growth_pct"],
+            }
+            for date, stats in rolling_sales(daily_stats, rolling_window).items()
+        }
 
     # -----------------------------------------------------------
     # 7. PRODUCT PERFORMANCE ANALYSIS
     # -----------------------------------------------------------
-    peak_date, peak_rev, peak_count = find_peak_sales_day(transactions)
-    low_products = low_performing_products(transactions, threshold=10)
-
-    report.append("PRODUCT PERFORMANCE ANALYSIS")
-    report.append("----------------------------------------------")
-    report.append(f"Best Sales Day: {peak_date} (₹{peak_rev:,.0f}, {peak_count} transactions)\n")
+    if transactions:
+        peak_date, peak_rev, peak_count = find_peak_sales_day(transactions)
+        yield "peak_sales_day", {
+            "date": peak_date,
+            "revenue_paise": peak_rev,
+            "transaction_count": peak_count,
+        }
 
-    report.append("Low Performing Products (Qty < 10):")
-    for name, qty, revenue in low_products:
-        report.append(f" - {name}: Qty {qty}, Revenue ₹{revenue:,.0f}")
+    yield "low_performing_products", {
+        name: {"total_qty": qty, "total_revenue_paise": revenue}
+        for name, qty, revenue in low_performing_products(transactions, threshold=10)
+    }
 
-    report.append("")
+    # -----------------------------------------------------------
+    # 7b. PRODUCT AFFINITY / MARKET BASKET (optional)
+    # -----------------------------------------------------------
+    if basket_top_k is not None:
+        yield "product_affinity", {
+            f"{a} + {b}": {
+                "product_a": a,
+                "product_b": b,
+                "customers": both,
+                "support": support,
+                "confidence": confidence,
+                "lift": lift,
+            }
+            for a, b, both, support, confidence, lift
+            in market_basket_analysis(transactions, k=basket_top_k)
+        }
 
     # -----------------------------------------------------------
     # 8. API ENRICHMENT SUMMARY
     # -----------------------------------------------------------
     total_enriched = len(enriched_transactions)
     success = sum(1 for tx in enriched_transactions if tx.get("API_Match"))
-    failed = total_enriched - success
     success_pct = (success / total_enriched * 100) if total_enriched else 0
-    total_unriched = 0
 
-    report.append("API ENRICHMENT SUMMARY")
-    report.append("----------------------------------------------")
-    report.append(f"Total Products Enriched: {total_enriched}")
-    report.append(f"Successful Matches: {success} ({success_pct:.2f}%)")
+    yield "enrichment_summary", {
+        "total_enriched": total_enriched,
+        "successful_matches": success,
+        "success_percentage": success_pct,
+    }
 
-    # List products that failed API enrichment (only if any exist)
-    failed_items = [tx for tx in enriched_transactions if not tx.get("API_Match")]
+    # Failed items are grouped by ProductID (one entry per product, not per row)
+    failed = {}
+    for tx in enriched_transactions:
+        if tx.get("API_Match"):
+            continue
 
-    if failed_items:
-        report.append("Products That Could Not Be Enriched:")
-        for tx in failed_items:
-            report.append(f" - {tx['ProductID']} ({tx['ProductName']})")
-        report.append("")  # spacing line
+        pid = tx["ProductID"]
+        if pid not in failed:
+            failed[pid] = {"names": [], "transactions": 0}
 
+        failed[pid]["transactions"] += 1
+        if tx["ProductName"] not in failed[pid]["names"]:
+            failed[pid]["names"].append(tx["ProductName"])
+
+    yield "failed_enrichment", {
+        pid: {"names": "; ".join(info["names"]), "transactions": info["transactions"]}
+        for pid, info in sorted(failed.items())
+    }
+
+
+def _text_section(name, data):
+    """
+    Yields the formatted text lines for one report section.
+    """
+
+    rule = "----------------------------------------------"
+
+    if name == "header":
+        yield "=============================================="
+        yield "             SALES ANALYTICS REPORT           "
+        yield "=============================================="
+        yield f"Generated: {data['generated']}"
+        yield f"Records Processed: {data['records_processed']}"
+        yield "=============================================="
+        yield ""
+
+    elif name == "overall_summary":
+        yield "OVERALL SUMMARY"
+        yield rule
+        yield f"Total Revenue: {format_inr(data['total_revenue_paise'])}"
+        yield f"Total Transactions: {data['total_transactions']}"
+        yield f"Average Order Value: {format_inr(data['avg_order_value_paise'])}"
+        yield f"Date Range: {data['first_date']} to {data['last_date']}"
+        yield ""
+
+    elif name == "region_performance":
+        yield "REGION-WISE PERFORMANCE"
+        yield rule
+        yield f"{'Region':10} {'Sales':15} {'% of Total':15} {'Transactions'}"
+        for region, stats in data.items():
+            yield (
+                f"{region:10} "
+                f"{format_inr(stats['total_sales_paise'], 0)}   "
+                f"{stats['percentage']:.2f}%        "
+                f"{stats['transaction_count']}"
+            )
+        yield ""
+
+    elif name == "top_products":
+        yield "TOP 5 PRODUCTS"
+        yield rule
+        yield f"{'Rank':5} {'Product':20} {'Qty Sold':10} {'Revenue'}"
+        for product, stats in data.items():
+            yield (
+                f"{stats['rank']:<5} {product:20} {stats['total_qty']:<10} "
+                f"{format_inr(stats['total_revenue_paise'], 0)}"
+            )
+        yield ""
+
+    elif name == "top_customers":
+        yield "TOP 5 CUSTOMERS"
+        yield rule
+        yield f"{'Rank':5} {'Customer':10} {'Total Spent':15} {'Orders'}"
+        for cid, stats in data.items():
+            yield (
+                f"{stats['rank']:<5} {cid:10} "
+                f"{format_inr(stats['total_spent_paise'], 0)}       {stats['purchase_count']}"
+            )
+        yield ""
+
+    elif name == "daily_sales_trend":
+        yield "DAILY SALES TREND"
+        yield rule
+        yield f"{'Date':12} {'Revenue':12} {'Transactions':12} {'Unique Customers'}"
+        for date, stats in data.items():
+            yield (
+                f"{date:12} "
+                f"{format_inr(stats['revenue_paise'], 0)}      "
+                f"{stats['transaction_count']:10}     "
+                f"{stats['unique_customers']}"
+            )
+        yield ""
+
+    elif name == "peak_sales_window":
+        yield f"ROLLING {data['window_days']}-DAY SALES"
+        yield rule
+        if data["start_date"] is None:
+            yield "No sales with a YYYY-MM-DD date to analyse."
+        else:
+            yield (
+                f"Best {data['window_days']}-Day Window: {data['start_date']} to {data['end_date']} "
+                f"({format_inr(data['revenue_paise'], 0)})"
+            )
+        if data["undated_days"]:
+            yield (
+                f"Excluded {data['undated_days']} date(s) not in YYYY-MM-DD format "
+                f"({format_inr(data['undated_revenue_paise'], 0)})"
+            )
+
+    elif name == "region_peak_windows":
+        if data:
+            yield "Best Window by Region:"
+        for region, peak in data.items():
+            yield (
+                f" - {region}: {peak['start_date']} to {peak['end_date']} "
+                f"({format_inr(peak['revenue_paise'], 0)})"
+            )
+        yield ""
+
+    elif name == "rolling_sales":
+        yield f"{'Date':12} {'Revenue':12} {'Rolling Total':15} {'Moving Avg':12} {'DoD Growth'}"
+        for date, stats in data.items():
+            growth = stats["growth_pct"]
+            growth_text = f"{growth:+.2f}%" if growth is not None else "-"
+            yield (
+                f"{date:12} "
+                f"{format_inr(stats['revenue_paise'], 0):12} "
+                f"{format_inr(stats['rolling_revenue_paise'], 0):15} "
+                f"{format_inr(stats['moving_average_paise'], 0):12} "
+                f"{growth_text}"
+            )
+        yield ""
+
+    elif name == "peak_sales_day":
+        yield "PRODUCT PERFORMANCE ANALYSIS"
+        yield rule
+        yield (
+            f"Best Sales Day: {data['date']} "
+            f"({format_inr(data['revenue_paise'], 0)}, {data['transaction_count']} transactions)"
+        )
+        yield ""
+
+    elif name == "low_performing_products":
+        yield "Low Performing Products (Qty < 10):"
+        for product, stats in data.items():
+            yield (
+                f" - {product}: Qty {stats['total_qty']}, "
+                f"Revenue {format_inr(stats['total_revenue_paise'], 0)}"
+            )
+        yield ""
+
+    elif name == "product_affinity":
+        yield "PRODUCT AFFINITY (BOUGHT TOGETHER)"
+        yield rule
+        yield f"{'Product Pair':40} {'Customers':10} {'Support':10} {'Lift'}"
+        for pair, stats in data.items():
+            yield (
+                f"{pair:40} {stats['customers']:<10} "
+                f"{stats['support'] * 100:.2f}%     {stats['lift']:.2f}"
+            )
+        if not data:
+            yield "No product pairs bought together by 2 or more customers."
+        yield ""
+
+    elif name == "enrichment_summary":
+        yield "API ENRICHMENT SUMMARY"
+        yield rule
+        yield f"Total Products Enriched: {data['total_enriched']}"
+        yield f"Successful Matches: {data['successful_matches']} ({data['success_percentage']:.2f}%)"
+
+    elif name == "failed_enrichment":
+        # List products that failed API enrichment (only if any exist)
+        if data:
+            yield "Products That Could Not Be Enriched:"
+            for pid, info in data.items():
+                yield f" - {pid} ({info['names']}): {info['transactions']} transactions"
+            yield ""  # spacing line
+
+
+def _csv_rows(name, data):
+    """
+    Flattens one report section into (section, key, field, value) rows.
+    """
+
+    for key, value in data.items():
+        if isinstance(value, dict):
+            for field, field_value in value.items():
+                yield (name, key, field, field_value)
+        else:
+            yield (name, "", key, value)
+
+
+def generate_sales_report(
+    transactions,
+    enriched_transactions,
+    output_file="output/sales_report.txt",
+    data_format=None,
+    rolling_window=None,
+    basket_top_k=None,
+    memory_limit=None
+):
+    """
+    Generates a comprehensive formatted sales report.
+    Includes all 8 required sections in the correct order.
+
+    Sections are written to the file as they are produced. With data_format
+    set to "json" or "csv", a machine-readable copy of the same sections is
+    written next to the text report (e.g. output/sales_report.json).
+    With rolling_window (days) set, a rolling sales section is added.
+    With basket_top_k set, the top product affinity pairs are added.
+    With memory_limit (bytes) set, high-cardinality aggregations spill to disk.
+    """
+
+    if data_format not in (None, "json", "csv"):
+        raise ValueError(f"Unsupported report data format: {data_format}")
+
+    # Check options before the report file is opened (and truncated)
+    if rolling_window is not None and rolling_window < 1:
+        raise ValueError("rolling_window must be at least 1 day")
+    if basket_top_k is not None and basket_top_k < 1:
+        raise ValueError("basket_top_k must be at least 1")
+
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    data_file = None
+    if data_format is not None:
+        data_file = os.path.splitext(output_file)[0] + "." + data_format
 
-    # -----------------------------------------------------------
-    # WRITE FILE
-    # -----------------------------------------------------------
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(report))
+        data_f = None
+        if data_file is not None:
+            data_f = open(data_file, "w", encoding="utf-8", newline="")
+
+        try:
+            if data_format == "csv":
+                writer = csv.writer(data_f)
+                writer.writerow(["section", "key", "field", "value"])
+            elif data_format == "json":
+                data_f.write("{")
+
+            for index, (name, data) in enumerate(_report_sections(
+                transactions, enriched_transactions, rolling_window, basket_top_k,
+                memory_limit
+            )):
+                for line in _text_section(name, data):
+                    f.write(line + "\n")
+
+                if data_format == "csv":
+                    writer.writerows(_csv_rows(name, data))
+                elif data_format == "json":
+                    separator = "," if index else ""
+                    data_f.write(f"{separator}\n{json.dumps(name)}: ")
+                    data_f.write(json.dumps(data, ensure_ascii=False))
+
+            if data_format == "json":
+                data_f.write("\n}\n")
+        finally:
+            if data_f is not None:
+                data_f.close()
 
     print(f"Sales report successfully saved to: {output_file}")
+    if data_file is not None:
+        print(f"Report data successfully saved to: {data_file}")
@@ -1,31 +1,37 @@
+import heapq
+
+from utils.money import tx_amount_paise, divide_paise
+from utils.spill_aggregator import SpillingAggregator, SET_ITEM_OVERHEAD_BYTES
+
+
 def calculate_total_revenue(transactions):
     """
-    Calculates total revenue from all transactions.
+    Calculates total revenue from all transactions (in integer paise).
     """
-    total = 0.0
+    total = 0
 
     for tx in transactions:
-        total += tx["Quantity"] * tx["UnitPrice"]
+        total += tx_amount_paise(tx)
 
     return total
 
 
 def region_wise_sales(transactions):
     """
-    Analyzes sales by region.
+    Analyzes sales by region (sales in integer paise).
     """
 
     region_stats = {}
-    overall_total_sales = 0.0
+    overall_total_sales = 0
 
     # Step 1: Aggregate totals by region
     for tx in transactions:
         region = tx["Region"]
-        amount = tx["Quantity"] * tx["UnitPrice"]
+        amount = tx_amount_paise(tx)
 
         if region not in region_stats:
             region_stats[region] = {
-                "total_sales": 0.0,
+                "total_sales": 0,
                 "transaction_count": 0
             }
 
@@ -53,7 +59,7 @@ def region_wise_sales(transactions):
 
 def top_selling_products(transactions, n=5):
     """
-    Finds top n products by total quantity sold.
+    Finds top n products by total quantity sold (revenue in integer paise).
     """
 
     product_stats = {}
@@ -62,12 +68,12 @@ def top_selling_products(transactions, n=5):
     for tx in transactions:
         name = tx["ProductName"]
         qty = tx["Quantity"]
-        revenue = tx["Quantity"] * tx["UnitPrice"]
+        revenue = tx_amount_paise(tx)
 
         if name not in product_stats:
             product_stats[name] = {
                 "total_qty": 0,
-                "total_revenue": 0.0
+                "total_revenue": 0
             }
 
         product_stats[name]["total_qty"] += qty
@@ -90,85 +96,185 @@ def top_selling_products(transactions, n=5):
     return product_list[:n]
 
 
-def customer_analysis(transactions):
+def _merge_sets(into, partial, field):
     """
-    Analyzes customer purchase patterns.
+    Unions partial[field] into into[field] and returns the approximate bytes added.
     """
 
-    customer_stats = {}
+    before = len(into[field])
+    into[field] |= partial[field]
+    return (len(into[field]) - before) * SET_ITEM_OVERHEAD_BYTES
 
-    # Step 1: Aggregate per customer
-    for tx in transactions:
-        cid = tx["CustomerID"]
-        product = tx["ProductName"]
-        amount = tx["Quantity"] * tx["UnitPrice"]
-
-        if cid not in customer_stats:
-            customer_stats[cid] = {
-                "total_spent": 0.0,
-                "purchase_count": 0,
-                "products": set()
-            }
 
-        customer_stats[cid]["total_spent"] += amount
-        customer_stats[cid]["purchase_count"] += 1
-        customer_stats[cid]["products"].add(product)
+def _merge_customer_state(into, partial):
+    """
+    Folds a partial per-customer state into another (for SpillingAggregator).
+    """
 
-    # Step 2: Finalize metrics and convert sets to lists
-    final_output = {}
+    into["total_spent"] += partial["total_spent"]
+    into["purchase_count"] += partial["purchase_count"]
+    into["first_seen"] = min(into["first_seen"], partial["first_seen"])
+    return _merge_sets(into, partial, "products")
 
-    for cid, stats in customer_stats.items():
 
-        avg_order = (
-            stats["total_spent"] / stats["purchase_count"]
-            if stats["purchase_count"] > 0 else 0.0
-        )
+def _merge_daily_state(into, partial):
+    """
+    Folds a partial per-date state into another (for SpillingAggregator).
+    """
 
-        final_output[cid] = {
-            "total_spent": stats["total_spent"],
-            "purchase_count": stats["purchase_count"],
-            "avg_order_value": avg_order,
-            "products_bought": list(stats["products"])
-        }
+    into["revenue"] += partial["revenue"]
+    into["transaction_count"] += partial["transaction_count"]
+    return _merge_sets(into, partial, "customers")
 
-    # Step 3: Sort by total_spent descending
-    sorted_output = dict(
-        sorted(final_output.items(),
-               key=lambda item: item[1]["total_spent"],
-               reverse=True)
-    )
 
-    return sorted_output
+def _customer_states(transactions, memory_limit=None):
+    """
+    Yields (cid, state, first_seen) for every customer, one at a time.
+    first_seen orders customers by first appearance in both paths.
+
+    With memory_limit (bytes) set, state is aggregated within that budget,
+    spilled to temporary files when exceeded, and streamed back from the
+    merged runs, so only a bounded amount is held in memory at once.
+    """
+
+    if memory_limit is None:
+        customer_stats = {}
+
+        for tx in transactions:
+            cid = tx["CustomerID"]
+            product = tx["ProductName"]
+            amount = tx_amount_paise(tx)
+
+            if cid not in customer_stats:
+                customer_stats[cid] = {
+                    "total_spent": 0,
+                    "purchase_count": 0,
+                    "products": set()
+                }
+
+            customer_stats[cid]["total_spent"] += amount
+            customer_stats[cid]["purchase_count"] += 1
+            customer_stats[cid]["products"].add(product)
+
+        # Dict order is first-appearance order
+        for first_seen, (cid, stats) in enumerate(customer_stats.items()):
+            yield cid, stats, first_seen
+        return
 
+    with SpillingAggregator(memory_limit, _merge_customer_state) as aggregator:
+        for index, tx in enumerate(transactions):
+            aggregator.add(tx["CustomerID"], {
+                "total_spent": tx_amount_paise(tx),
+                "purchase_count": 1,
+                "products": {tx["ProductName"]},
+                "first_seen": index
+            })
 
-def daily_sales_trend(transactions):
+        for cid, stats in aggregator.items():
+            yield cid, stats, stats["first_seen"]
+
+
+def _daily_states(transactions, memory_limit):
     """
-    Analyzes sales trends by date.
+    Yields (date, state) per date, aggregated within memory_limit bytes and
+    streamed back from the spilled runs.
     """
 
-    daily_stats = {}
+    with SpillingAggregator(memory_limit, _merge_daily_state) as aggregator:
+        for tx in transactions:
+            aggregator.add(tx["Date"], {
+                "revenue": tx_amount_paise(tx),
+                "transaction_count": 1,
+                "customers": {tx["CustomerID"]}
+            })
+
+        yield from aggregator.items()
+
+
+def _customer_metrics(stats):
+    """
+    Turns an aggregated customer state into the customer_analysis() entry.
+    """
+
+    return {
+        "total_spent": stats["total_spent"],
+        "purchase_count": stats["purchase_count"],
+        "avg_order_value": divide_paise(stats["total_spent"], stats["purchase_count"]),
+        "products_bought": sorted(stats["products"])
+    }
+
+
+def customer_analysis(transactions, memory_limit=None):
+    """
+    Analyzes customer purchase patterns (amounts in integer paise).
+    With memory_limit (bytes) set, aggregation state is bounded and spilled
+    to temporary files, but the returned dict still holds every customer;
+    use top_customers() when only the leaders are needed.
+    """
+
+    # Step 1 + 2: Aggregate per customer and finalize metrics
+    rows = [
+        (-stats["total_spent"], first_seen, cid, _customer_metrics(stats))
+        for cid, stats, first_seen in _customer_states(transactions, memory_limit)
+    ]
+
+    # Step 3: Sort by total_spent descending (ties keep first-appearance order)
+    rows.sort(key=lambda row: (row[0], row[1]))
+
+    return {cid: metrics for _, _, cid, metrics in rows}
+
+
+def top_customers(transactions, n=5, memory_limit=None):
+    """
+    Returns the top n (cid, stats) pairs of customer_analysis() without
+    building the full result: customers are streamed through a heap of size n.
+    """
+
+    top = heapq.nsmallest(
+        n,
+        _customer_states(transactions, memory_limit),
+        key=lambda row: (-row[1]["total_spent"], row[2])
+    )
+
+    return [(cid, _customer_metrics(stats)) for cid, stats, _ in top]
+
+
+def daily_sales_trend(transactions, memory_limit=None):
+    """
+    Analyzes sales trends by date (revenue in integer paise).
+    With memory_limit (bytes) set, per-date state is aggregated with a
+    bounded memory budget and spilled to temporary files when exceeded; the
+    merged states are streamed back and only the per-date counts are kept.
+    """
 
     # Step 1: Aggregate per date
-    for tx in transactions:
-        date = tx["Date"]
-        amount = tx["Quantity"] * tx["UnitPrice"]
-        customer = tx["CustomerID"]
+    if memory_limit is not None:
+        daily_items = _daily_states(transactions, memory_limit)
+    else:
+        daily_stats = {}
 
-        if date not in daily_stats:
-            daily_stats[date] = {
-                "revenue": 0.0,
-                "transaction_count": 0,
-                "customers": set()
-            }
+        for tx in transactions:
+            date = tx["Date"]
+            amount = tx_amount_paise(tx)
+            customer = tx["CustomerID"]
 
-        daily_stats[date]["revenue"] += amount
-        daily_stats[date]["transaction_count"] += 1
-        daily_stats[date]["customers"].add(customer)
+            if date not in daily_stats:
+                daily_stats[date] = {
+                    "revenue": 0,
+                    "transaction_count": 0,
+                    "customers": set()
+                }
+
+            daily_stats[date]["revenue"] += amount
+            daily_stats[date]["transaction_count"] += 1
+            daily_stats[date]["customers"].add(customer)
+
+        daily_items = daily_stats.items()
 
     # Step 2: Convert sets → unique customer count
     final_output = {}
 
-    for date, stats in daily_stats.items():
+    for date, stats in daily_items:
         final_output[date] = {
             "revenue": stats["revenue"],
             "transaction_count": stats["transaction_count"],
@@ -183,7 +289,7 @@ def daily_sales_trend(transactions):
 
 def find_peak_sales_day(transactions):
     """
-    Identifies the date with highest revenue.
+    Identifies the date with highest revenue (revenue in integer paise).
     """
 
     # First reuse daily stats
@@ -191,11 +297,11 @@ def find_peak_sales_day(transactions):
 
     for tx in transactions:
         date = tx["Date"]
-        amount = tx["Quantity"] * tx["UnitPrice"]
+        amount = tx_amount_paise(tx)
 
         if date not in daily_stats:
             daily_stats[date] = {
-                "revenue": 0.0,
+                "revenue": 0,
                 "transaction_count": 0
             }
 
@@ -213,7 +319,7 @@ def find_peak_sales_day(transactions):
 
 def low_performing_products(transactions, threshold=10):
     """
-    Identifies products with low sales.
+    Identifies products with low sales (revenue in integer paise).
     """
 
     product_stats = {}
@@ -222,12 +328,12 @@ def low_performing_products(transactions, threshold=10):
     for tx in transactions:
         name = tx["ProductName"]
         qty = tx["Quantity"]
-        revenue = tx["Quantity"] * tx["UnitPrice"]
+        revenue = tx_amount_paise(tx)
 
         if name not in product_stats:
             product_stats[name] = {
                 "total_qty": 0,
-                "total_revenue": 0.0
+                "total_revenue": 0
             }
 
         product_stats[name]["total_qty"] += qty
@@ -0,0 +1,215 @@
+import contextlib
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BLOOM_FILE = "transaction_ids.bloom"
+ID_DB_FILE = "transaction_ids.sqlite"
+LOCK_FILE = "transaction_ids.lock"
+
+_BLOOM_MAGIC = b"TXBLOOM1"
+_BLOOM_HEADER = struct.Struct("<8sQQQ")  # magic, bits, hashes, items
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set: no false negatives, rare false positives.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest give k positions
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, filename):
+        """
+        Writes the filter to a binary file (atomically).
+        """
+
+        tmp_file = filename + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+        os.replace(tmp_file, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a filter written by save().
+        """
+
+        with open(filename, "rb") as f:
+            magic, num_bits, num_hashes, count = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"'{filename}' is not a transaction ID filter")
+            bits = bytearray(f.read())
+
+        bloom = cls.__new__(cls)
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.count = count
+        bloom.bits = bits
+        # Recover the design capacity from the sizing formula
+        bloom.capacity = max(1, round(num_bits * math.log(2) / num_hashes))
+        bloom.error_rate = math.exp(-num_bits / bloom.capacity * (math.log(2) ** 2))
+        return bloom
+
+
+class TransactionDeduplicator:
+    """
+    Detects repeated TransactionIDs within a run and across previous runs.
+
+    IDs seen in this run are kept in a hash set. With a state_dir, IDs from
+    earlier runs are checked against a persisted Bloom filter first; only
+    filter hits are confirmed exactly in an indexed SQLite table, so each
+    row costs O(1) and old data is never reloaded. New IDs are persisted
+    by commit(), which should be called once the run has succeeded; commits
+    from parallel runs sharing a state_dir are merged under a file lock.
+    """
+
+    def __init__(self, state_dir=None, capacity=1_000_000, error_rate=0.001):
+        self.state_dir = state_dir
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.seen = set()
+        self.new_ids = []
+        self.bloom = None
+        self._db = None
+
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(state_dir, ID_DB_FILE))
+            self._db.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+            bloom_file = os.path.join(state_dir, BLOOM_FILE)
+            if os.path.exists(bloom_file):
+                self.bloom = BloomFilter.load(bloom_file)
+            else:
+                # First run, or the filter was removed: rebuild from the ID table
+                self.bloom = self._rebuild_bloom(capacity)
+
+    def _rebuild_bloom(self, capacity):
+        """
+        Builds a fresh filter from every persisted ID.
+        """
+
+        bloom = BloomFilter(capacity, self.error_rate)
+        for (tid,) in self._db.execute("SELECT id FROM ids"):
+            bloom.add(tid)
+        return bloom
+
+    def _seen_in_previous_run(self, tid):
+        if self.bloom is None or tid not in self.bloom:
+            return False
+
+        # Filter hit: confirm exactly (rules out false positives)
+        row = self._db.execute("SELECT 1 FROM ids WHERE id = ?", (tid,)).fetchone()
+        return row is not None
+
+    def check(self, tid):
+        """
+        Returns None for a new ID, else "duplicate_in_run" or
+        "duplicate_previous_run". New IDs are remembered.
+        """
+
+        if tid in self.seen:
+            return "duplicate_in_run"
+
+        if self._seen_in_previous_run(tid):
+            return "duplicate_previous_run"
+
+        self.seen.add(tid)
+        self.new_ids.append(tid)
+        return None
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Holds an exclusive lock on the state directory (POSIX only; elsewhere
+        concurrent commits to one state directory are not supported).
+        """
+
+        with open(os.path.join(self.state_dir, LOCK_FILE), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def commit(self):
+        """
+        Persists the IDs first seen in this run (no-op without state_dir).
+
+        Other runs (e.g. parallel shards) may have committed since this one
+        loaded the filter, so under a lock the current on-disk filter is
+        reloaded and extended rather than overwritten. Returns how many IDs
+        turned out to be already stored by such a concurrent run.
+        """
+
+        if self._db is None or not self.new_ids:
+            return 0
+
+        bloom_file = os.path.join(self.state_dir, BLOOM_FILE)
+
+        with self._locked():
+            # Start from the latest filter so concurrent commits are kept
+            if os.path.exists(bloom_file):
+                bloom = BloomFilter.load(bloom_file)
+            else:
+                bloom = self._rebuild_bloom(self.capacity)
+
+            if bloom.count + len(self.new_ids) > bloom.capacity:
+                # Filter is full: grow it so the false positive rate stays low
+                total = bloom.count + len(self.new_ids)
+                bloom = self._rebuild_bloom(max(self.capacity, 2 * total))
+
+            # The filter is saved before the ID table: if the run stops in between,
+            # the filter only has extra IDs, which exact confirmation rules out
+            for tid in self.new_ids:
+                bloom.add(tid)
+            bloom.save(bloom_file)
+
+            changes_before = self._db.total_changes
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO ids (id) VALUES (?)",
+                    ((tid,) for tid in self.new_ids)
+                )
+            already_stored = len(self.new_ids) - (self._db.total_changes - changes_before)
+
+        self.bloom = bloom
+        self.new_ids = []
+        return already_stored
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,8 +1,49 @@
+import glob
+import gzip
+import io
 import json
+import math
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-def read_sales_data(filename):
+from utils.money import to_paise, tx_amount_paise, paise_to_rupees
+
+# Files inside a directory input that are treated as sales shards
+SHARD_SUFFIXES = (".txt", ".txt.gz", ".txt.zst")
+
+# Files given on their own that list one shard path per line
+MANIFEST_SUFFIXES = (".manifest", ".lst")
+
+
+def _open_text(filename, encoding):
+    """
+    Opens a plain, gzip or zstd file as a text stream.
+    Compressed files are decompressed on the fly (no temp files).
+    """
+
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt", encoding=encoding)
+
+    if filename.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                f"Reading '{filename}' requires the 'zstandard' package."
+            )
+        raw = open(filename, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding=encoding)
+
+    return open(filename, "r", encoding=encoding)
+
+
+def read_sales_data(filename, with_line_numbers=False):
     """
     Reads sales data from file handling encoding issues.
+    Supports gzip (.gz) and zstd (.zst) compressed files.
+    With with_line_numbers=True each entry is a (filename, line_no, line) tuple.
     """
 
     encodings_to_try = ("utf-8", "latin-1", "cp1252")
@@ -11,8 +52,8 @@ def read_sales_data(filename):
     # Try multiple encodings
     for enc in encodings_to_try:
         try:
-            with open(filename, "r", encoding=enc) as f:
-                lines = [line.rstrip("\n") for line in f.readlines()]
+            with _open_text(filename, enc) as f:
+                lines = [line.rstrip("\n") for line in f]
             break  # Successfully read
         except FileNotFoundError:
             print(f"Error: File '{filename}' not found.")
@@ -26,23 +67,190 @@ def read_sales_data(filename):
         return []
 
     # Remove header + empty lines
-    data_lines = [line for line in lines[1:] if line.strip()]
+    if with_line_numbers:
+        data_lines = [
+            (filename, line_no, line)
+            for line_no, line in enumerate(lines[1:], start=2)
+            if line.strip()
+        ]
+    else:
+        data_lines = [line for line in lines[1:] if line.strip()]
 
     return data_lines
 
 
-def parse_transactions(raw_lines):
+def resolve_input_files(sources):
+    """
+    Expands globs, directories and manifest files into a sorted list of shards.
+    """
+
+    if isinstance(sources, str):
+        sources = [sources]
+
+    files = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for name in os.listdir(source):
+                path = os.path.join(source, name)
+                if os.path.isfile(path) and name.endswith(SHARD_SUFFIXES):
+                    files.append(path)
+
+        elif source.endswith(MANIFEST_SUFFIXES):
+            base_dir = os.path.dirname(source)
+            with open(source, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = line.strip()
+                    if entry and not entry.startswith("#"):
+                        files.extend(resolve_input_files(os.path.join(base_dir, entry)))
+
+        elif glob.has_magic(source):
+            files.extend(p for p in glob.glob(source) if os.path.isfile(p))
+
+        else:
+            files.append(source)
+
+    # Remove duplicates while keeping a deterministic order
+    return sorted(set(files))
+
+
+def read_sales_files(sources, workers=4, with_line_numbers=False):
+    """
+    Reads many sales shards concurrently and merges their data lines.
+    Only reading/decompression is parallel; the merged lines are parsed and
+    aggregated once afterwards, in sorted file order.
+
+    with_line_numbers is passed on to read_sales_data().
+    """
+
+    files = resolve_input_files(sources)
+
+    # Read shards in parallel; map() keeps results in file order
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        shard_lines = list(pool.map(
+            lambda path: read_sales_data(path, with_line_numbers),
+            files
+        ))
+
+    data_lines = []
+    for lines in shard_lines:
+        data_lines.extend(lines)
+
+    return data_lines
+
+
+class QuarantineSink:
+    """
+    Collects rejected rows with their line number and reason code.
+
+    Rows are buffered (at most buffer_size at a time) and streamed to a
+    pipe-delimited side file while parsing/validation runs, so no second
+    scan of the data is needed. Without a filename only the per-reason
+    counters are kept: counts covers every rejected row and parse_counts
+    the subset that could not be parsed at all.
+    """
+
+    HEADER = "Source|LineNo|Reason|Row"
+
+    def __init__(self, filename=None, buffer_size=1000):
+        self.filename = filename
+        self.buffer_size = max(1, buffer_size)
+        self.counts = Counter()
+        self.parse_counts = Counter()
+        self._buffer = []
+        self._file = None
+
+        if filename:
+            out_dir = os.path.dirname(filename)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            self._file = open(filename, "w", encoding="utf-8")
+            self._file.write(self.HEADER + "\n")
+
+    def reject(self, reason, row, source=None, line_no=None):
+        """
+        Records one rejected row under the given reason code.
+        """
+
+        self.counts[reason] += 1
+
+        if self._file is None:
+            return
+
+        self._buffer.append(f"{source or ''}|{line_no or ''}|{reason}|{row}")
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def reject_unparsed(self, reason, row, source=None, line_no=None):
+        """
+        Records one row that parse_transactions could not turn into a transaction.
+        """
+
+        self.parse_counts[reason] += 1
+        self.reject(reason, row, source, line_no)
+
+    def flush(self):
+        """
+        Writes buffered rows to the quarantine file.
+        """
+
+        if self._file is not None and self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+
+    def close(self):
+        """
+        Flushes remaining rows and closes the quarantine file.
+        """
+
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _row_text(tx):
+    """
+    Returns the source line of a parsed transaction, exactly as it was read.
+    Transactions built without one get a pipe-delimited row rebuilt from their fields.
+    """
+
+    if tx.get("RawLine") is not None:
+        return tx["RawLine"]
+
+    return "|".join(str(tx[field]) for field in (
+        "TransactionID", "Date", "ProductID", "ProductName",
+        "Quantity", "UnitPrice", "CustomerID", "Region"
+    ))
+
+
+def parse_transactions(raw_lines, quarantine=None):
     """
     Parses raw sales data into a clean list of dictionaries.
+    Rows that cannot be parsed are reported to quarantine (if given).
     """
 
     transactions = []
 
-    for line in raw_lines:
+    for index, entry in enumerate(raw_lines, start=1):
+        # Entries are plain lines or (source, line_no, line) tuples
+        if isinstance(entry, tuple):
+            source, line_no, line = entry
+        else:
+            source, line_no, line = None, index, entry
+
         parts = line.split("|")
 
         # Valid rows must have exactly 8 fields
         if len(parts) != 8:
+            if quarantine is not None:
+                quarantine.reject_unparsed("field_count", line, source, line_no)
             continue
 
         (
@@ -63,12 +271,20 @@ def parse_transactions(raw_lines):
         quantity = quantity.replace(",", "")
         unit_price = unit_price.replace(",", "")
 
-        # Convert data types
+        # Convert data types (prices are kept exactly as integer paise)
         try:
             quantity = int(quantity)
-            unit_price = float(unit_price)
         except ValueError:
             # Skip rows where conversion fails
+            if quarantine is not None:
+                quarantine.reject_unparsed("bad_quantity", line, source, line_no)
+            continue
+
+        try:
+            unit_price_paise = to_paise(unit_price)
+        except ValueError:
+            if quarantine is not None:
+                quarantine.reject_unparsed("bad_unit_price", line, source, line_no)
             continue
 
         transaction_dict = {
@@ -77,9 +293,13 @@ def parse_transactions(raw_lines):
             "ProductID": product_id,
             "ProductName": product_name,
             "Quantity": quantity,
-            "UnitPrice": unit_price,
+            "UnitPrice": paise_to_rupees(unit_price_paise),
+            "UnitPricePaise": unit_price_paise,
             "CustomerID": customer_id,
-            "Region": region
+            "Region": region,
+            "Source": source,
+            "LineNo": line_no,
+            "RawLine": line
         }
 
         transactions.append(transaction_dict)
@@ -87,35 +307,63 @@ def parse_transactions(raw_lines):
     return transactions
 
 
-def validate_and_filter(transactions, region=None, min_amount=None, max_amount=None):
+def _bound_paise(amount):
+    """
+    Converts an optional rupee filter bound to paise.
+    Non-finite bounds (e.g. float('inf')) mean no bound, as None does.
+    """
+
+    if amount is None or (isinstance(amount, float) and not math.isfinite(amount)):
+        return None
+
+    return to_paise(amount)
+
+
+def validate_and_filter(transactions, region=None, min_amount=None, max_amount=None,
+                        quarantine=None, deduplicator=None):
     """
     Validates transactions and applies optional filters.
+    Invalid transactions are reported to quarantine (if given) with a reason code.
+    With a deduplicator, rows that pass validation and the filters but whose
+    TransactionID was already seen (in this run or a previous one) are
+    dropped and counted as duplicates. Only IDs of rows that are kept are
+    recorded, so filtered-out rows can still be counted by a later run.
+
+    filter_summary["rejected_by_reason"] always counts the rows rejected by
+    this function (validation rules and duplicates). Rows dropped earlier by
+    parse_transactions are counted separately, under "parse_rejected" and
+    "parse_rejected_by_reason", when the same quarantine sink is passed to both.
     """
 
     total_input = len(transactions)
     valid_transactions = []
     invalid_count = 0
+    invalid_by_reason = Counter()
+    duplicates_by_reason = Counter()
 
     # Step 1: Validate transaction rules
     for tx in transactions:
-        # Validation rules
+        # Validation rules (first failing rule gives the reason)
         if tx["Quantity"] <= 0:
+            reason = "non_positive_quantity"
+        elif tx["UnitPrice"] <= 0:
+            reason = "non_positive_unit_price"
+        elif not tx["TransactionID"].startswith("T"):
+            reason = "bad_transaction_id"
+        elif not tx["ProductID"].startswith("P"):
+            reason = "bad_product_id"
+        elif not tx["CustomerID"].startswith("C"):
+            reason = "bad_customer_id"
+        elif tx["Region"] == "" or tx["CustomerID"] == "":
+            reason = "missing_region"
+        else:
+            reason = None
+
+        if reason is not None:
             invalid_count += 1
-            continue
-        if tx["UnitPrice"] <= 0:
-            invalid_count += 1
-            continue
-        if not tx["TransactionID"].startswith("T"):
-            invalid_count += 1
-            continue
-        if not tx["ProductID"].startswith("P"):
-            invalid_count += 1
-            continue
-        if not tx["CustomerID"].startswith("C"):
-            invalid_count += 1
-            continue
-        if tx["Region"] == "" or tx["CustomerID"] == "":
-            invalid_count += 1
+            invalid_by_reason[reason] += 1
+            if quarantine is not None:
+                quarantine.reject(reason, _row_text(tx), tx.get("Source"), tx.get("LineNo"))
             continue
 
         valid_transactions.append(tx)
@@ -134,17 +382,20 @@ def validate_and_filter(transactions, region=None, min_amount=None, max_amount=N
                 filtered_by_region += 1
         valid_transactions = filtered_region_list
 
-    # Step 3: Apply amount filter (optional)
-    if min_amount is not None or max_amount is not None:
+    # Step 3: Apply amount filter (optional, bounds given in rupees)
+    min_paise = _bound_paise(min_amount)
+    max_paise = _bound_paise(max_amount)
+
+    if min_paise is not None or max_paise is not None:
         filtered_amount_list = []
         for tx in valid_transactions:
-            amount = tx["Quantity"] * tx["UnitPrice"]
+            amount = tx_amount_paise(tx)
 
-            if min_amount is not None and amount < min_amount:
+            if min_paise is not None and amount < min_paise:
                 filtered_by_amount += 1
                 continue
 
-            if max_amount is not None and amount > max_amount:
+            if max_paise is not None and amount > max_paise:
                 filtered_by_amount += 1
                 continue
 
@@ -152,13 +403,37 @@ def validate_and_filter(transactions, region=None, min_amount=None, max_amount=N
 
         valid_transactions = filtered_amount_list
 
+    # Step 4: Drop re-delivered transactions (after the filters, so only
+    # rows that are actually reported get their IDs recorded)
+    if deduplicator is not None:
+        unique_list = []
+        for tx in valid_transactions:
+            duplicate = deduplicator.check(tx["TransactionID"])
+            if duplicate is not None:
+                duplicates_by_reason[duplicate] += 1
+                if quarantine is not None:
+                    quarantine.reject(duplicate, _row_text(tx), tx.get("Source"), tx.get("LineNo"))
+                continue
+            unique_list.append(tx)
+
+        valid_transactions = unique_list
+
+    # Rows that never became transactions (recorded by parse_transactions)
+    parse_rejects = quarantine.parse_counts if quarantine is not None else Counter()
+
     # Build summary dictionary
     filter_summary = {
         "total_input": total_input,
         "invalid": invalid_count,
         "filtered_by_region": filtered_by_region,
         "filtered_by_amount": filtered_by_amount,
+        "duplicates": sum(duplicates_by_reason.values()),
+        "duplicates_in_run": duplicates_by_reason["duplicate_in_run"],
+        "duplicates_previous_run": duplicates_by_reason["duplicate_previous_run"],
         "final_count": len(valid_transactions),
+        "rejected_by_reason": dict(invalid_by_reason + duplicates_by_reason),
+        "parse_rejected": sum(parse_rejects.values()),
+        "parse_rejected_by_reason": dict(parse_rejects),
     }
 
     return valid_transactions, invalid_count, filter_summary
\ No newline at end of file
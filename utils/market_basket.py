@@ -0,0 +1,123 @@
+import heapq
+
+
+def build_basket_matrices(transactions, product_key="ProductName"):
+    """
+    Builds sparse customer x product and product x product matrices in one pass.
+
+    Products are keyed by ProductName by default (as in customer_analysis()).
+    Returns a dict with:
+      - "products": product labels, indexed by product id
+      - "customers": customer ids, indexed by customer index
+      - "incidence": {customer_index: set of product ids} (customer x product)
+      - "product_customers": number of customers that bought each product
+      - "co_occurrence": {(i, j): customers that bought both}, with i < j
+
+    Only non-zero cells are stored, so memory grows with the number of
+    distinct (customer, product) and co-purchased pairs, never products^2.
+    """
+
+    product_index = {}
+    customer_index = {}
+    products = []
+    customers = []
+    incidence = {}
+    product_customers = []
+    co_occurrence = {}
+
+    for tx in transactions:
+        cid = tx["CustomerID"]
+        name = tx[product_key]
+
+        if cid not in customer_index:
+            customer_index[cid] = len(customers)
+            customers.append(cid)
+            incidence[customer_index[cid]] = set()
+
+        if name not in product_index:
+            product_index[name] = len(products)
+            products.append(name)
+            product_customers.append(0)
+
+        basket = incidence[customer_index[cid]]
+        pid = product_index[name]
+
+        if pid in basket:
+            continue
+
+        # First purchase of this product by this customer:
+        # pair it with everything already in the basket
+        for other in basket:
+            pair = (other, pid) if other < pid else (pid, other)
+            co_occurrence[pair] = co_occurrence.get(pair, 0) + 1
+
+        basket.add(pid)
+        product_customers[pid] += 1
+
+    return {
+        "products": products,
+        "customers": customers,
+        "incidence": incidence,
+        "product_customers": product_customers,
+        "co_occurrence": co_occurrence,
+    }
+
+
+def top_affinity_pairs(matrices, k=10, min_count=2, sort_by="lift"):
+    """
+    Finds the top k co-purchased product pairs.
+
+    Returns a list of tuples:
+    (product_a, product_b, customers_both, support, confidence, lift)
+    where product_a sorts before product_b by label, support is the share
+    of customers buying both, confidence is P(b | a) and lift is
+    support / (P(a) * P(b)). Pairs bought together by fewer than min_count
+    customers are ignored. The result does not depend on row order.
+    """
+
+    if sort_by not in ("lift", "count"):
+        raise ValueError("sort_by must be 'lift' or 'count'")
+
+    total_customers = len(matrices["customers"])
+    products = matrices["products"]
+    product_customers = matrices["product_customers"]
+
+    if not total_customers:
+        return []
+
+    def pair_stats(item):
+        (a, b), both = item
+
+        # Orient the pair by label so P(b | a) does not depend on row order
+        if products[b] < products[a]:
+            a, b = b, a
+
+        support = both / total_customers
+        confidence = both / product_customers[a]
+        lift = both * total_customers / (product_customers[a] * product_customers[b])
+        return (products[a], products[b], both, support, confidence, lift)
+
+    candidates = (
+        item for item in matrices["co_occurrence"].items()
+        if item[1] >= min_count
+    )
+    rows = map(pair_stats, candidates)
+
+    # Highest first; labels break ties, so the chosen k never depend on row order
+    if sort_by == "lift":
+        rank = lambda row: (-row[5], -row[2], row[0], row[1])
+    else:
+        rank = lambda row: (-row[2], -row[5], row[0], row[1])
+
+    # Keep only k rows in memory (result comes back already ordered)
+    return heapq.nsmallest(k, rows, key=rank)
+
+
+def market_basket_analysis(transactions, k=10, min_count=2, sort_by="lift",
+                           product_key="ProductName"):
+    """
+    Builds the basket matrices and returns the top k affinity pairs.
+    """
+
+    matrices = build_basket_matrices(transactions, product_key=product_key)
+    return top_affinity_pairs(matrices, k=k, min_count=min_count, sort_by=sort_by)
@@ -0,0 +1,83 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# All money is held as integer paise (1 rupee = 100 paise). Integer sums are
+# exact and associative, so totals do not depend on the order rows are added
+# in (serial, chunked or parallel), and values fit comfortably in an int64.
+PAISE_PER_RUPEE = 100
+
+
+def to_paise(value):
+    """
+    Converts a rupee amount (string, int or float) to integer paise.
+    Fractions of a paisa are rounded half-up. Raises ValueError on bad input.
+    """
+
+    if isinstance(value, int):
+        return value * PAISE_PER_RUPEE
+
+    text = str(value).replace(",", "").strip()
+
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid money value: {value!r}")
+
+    if not amount.is_finite():
+        raise ValueError(f"Invalid money value: {value!r}")
+
+    paise = (amount * PAISE_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return int(paise)
+
+
+def paise_to_rupees(paise):
+    """
+    Converts integer paise to a float rupee value (for display/export only).
+    """
+
+    return paise / PAISE_PER_RUPEE
+
+
+def tx_amount_paise(tx):
+    """
+    Returns the amount (Quantity * UnitPrice) of a transaction in paise.
+    """
+
+    unit_paise = tx.get("UnitPricePaise")
+    if unit_paise is None:
+        unit_paise = to_paise(tx["UnitPrice"])
+
+    return tx["Quantity"] * unit_paise
+
+
+def divide_paise(total_paise, count):
+    """
+    Divides a paise amount by a count, rounding half away from zero.
+    """
+
+    if not count:
+        return 0
+
+    quotient, remainder = divmod(abs(total_paise), count)
+    if remainder * 2 >= count:
+        quotient += 1
+
+    return -quotient if total_paise < 0 else quotient
+
+
+def format_inr(paise, decimals=2):
+    """
+    Formats integer paise as a rupee string, e.g. 123456 -> '₹1,234.56'.
+    With decimals=0 the amount is rounded half-up to whole rupees.
+    """
+
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(paise), PAISE_PER_RUPEE)
+
+    if decimals == 0:
+        if rest * 2 >= PAISE_PER_RUPEE:
+            rupees += 1
+        if rupees == 0:
+            sign = ""
+        return f"₹{sign}{rupees:,}"
+
+    return f"₹{sign}{rupees:,}.{rest:02d}"
@@ -0,0 +1,233 @@
+import heapq
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+
+# Rough per-entry overheads (CPython, 64-bit) used for the memory estimate
+ENTRY_OVERHEAD_BYTES = 400
+SET_ITEM_OVERHEAD_BYTES = 80
+
+MEMORY_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_memory_limit(text):
+    """
+    Parses a memory size such as '512M', '2G', '64k' or '1048576' into bytes.
+    """
+
+    value = str(text).strip().upper().rstrip("B")
+    unit = value[-1:] if value[-1:] in MEMORY_UNITS else ""
+    number = value[:-1] if unit else value
+
+    try:
+        size = float(number) * MEMORY_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"Invalid memory limit: {text!r}")
+
+    if size <= 0:
+        raise ValueError(f"Invalid memory limit: {text!r}")
+
+    return int(size)
+
+
+def approx_size(value):
+    """
+    Roughly estimates the memory used by a small aggregation state.
+    """
+
+    if isinstance(value, dict):
+        return ENTRY_OVERHEAD_BYTES + sum(approx_size(v) for v in value.values())
+    if isinstance(value, (set, list, tuple)):
+        return sum(SET_ITEM_OVERHEAD_BYTES + approx_size(v) for v in value)
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    return 32
+
+
+def _partition(key, partitions):
+    """
+    Stable hash partition for a key (independent of PYTHONHASHSEED).
+    """
+
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+def _encode(state):
+    return {k: sorted(v) if isinstance(v, set) else v for k, v in state.items()}
+
+
+def _decode(state):
+    # Lists only ever come from encoded sets
+    return {k: set(v) if isinstance(v, list) else v for k, v in state.items()}
+
+
+class SpillingAggregator:
+    """
+    External hash aggregation with a memory budget.
+
+    States are merged per key in memory. When the estimated size exceeds
+    memory_limit bytes, the state is hash-partitioned and each partition is
+    written to a temporary file sorted by key, then memory is cleared.
+    items() merges the sorted runs of one partition at a time, in rounds of
+    at most max_fan_in files so the open-file limit is never exceeded.
+
+    merge(into, partial) must fold partial into into (in place) and return
+    the approximate number of bytes it added. States are dicts of JSON
+    values plus sets (sets are stored as sorted lists on disk).
+    """
+
+    def __init__(self, memory_limit, merge, partitions=16, tmp_dir=None, max_fan_in=64):
+        self.memory_limit = memory_limit
+        self.merge = merge
+        self.partitions = partitions
+        self.max_fan_in = max(2, max_fan_in)
+        self.tmp_dir = tmp_dir
+        self.spill_count = 0
+
+        self._states = {}
+        self._bytes = 0
+        self._run_dir = None
+        self._runs = [[] for _ in range(partitions)]
+
+    def add(self, key, partial):
+        """
+        Merges a partial state into the state for key.
+        """
+
+        state = self._states.get(key)
+        if state is None:
+            self._states[key] = partial
+            self._bytes += approx_size(partial) + approx_size(key)
+        else:
+            self._bytes += self.merge(state, partial)
+
+        if self._bytes > self.memory_limit:
+            self._spill()
+
+    def _spill(self):
+        """
+        Writes the in-memory state to sorted per-partition run files.
+        """
+
+        if not self._states:
+            return
+
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix="sales_spill_", dir=self.tmp_dir)
+
+        buckets = [[] for _ in range(self.partitions)]
+        for key, state in self._states.items():
+            buckets[_partition(key, self.partitions)].append(key)
+
+        for index, keys in enumerate(buckets):
+            if not keys:
+                continue
+
+            keys.sort()
+            path = os.path.join(self._run_dir, f"p{index:03d}_r{self.spill_count:05d}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for key in keys:
+                    f.write(json.dumps([key, _encode(self._states[key])]) + "\n")
+            self._runs[index].append(path)
+
+        self.spill_count += 1
+        self._states = {}
+        self._bytes = 0
+
+    def _read_run(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, state = json.loads(line)
+                yield key, _decode(state)
+
+    def _merge_runs(self, paths):
+        """
+        Yields fully merged (key, state) pairs from sorted run files.
+        Opens len(paths) files at once; keeps one state per open run.
+        """
+
+        merged = heapq.merge(*(self._read_run(path) for path in paths), key=lambda kv: kv[0])
+
+        current_key, current = None, None
+        for key, state in merged:
+            if current is not None and key == current_key:
+                self.merge(current, state)
+                continue
+            if current is not None:
+                yield current_key, current
+            current_key, current = key, state
+
+        if current is not None:
+            yield current_key, current
+
+    def _reduce_runs(self, index, runs):
+        """
+        Merges runs in rounds of max_fan_in until one final merge is possible,
+        so no more than max_fan_in files are ever open at the same time.
+        """
+
+        round_number = 0
+        while len(runs) > self.max_fan_in:
+            next_runs = []
+            for start in range(0, len(runs), self.max_fan_in):
+                group = runs[start:start + self.max_fan_in]
+                if len(group) == 1:
+                    next_runs.append(group[0])
+                    continue
+
+                path = os.path.join(
+                    self._run_dir, f"p{index:03d}_m{round_number:03d}_{start:06d}.jsonl"
+                )
+                with open(path, "w", encoding="utf-8") as f:
+                    for key, state in self._merge_runs(group):
+                        f.write(json.dumps([key, _encode(state)]) + "\n")
+
+                for old_path in group:
+                    os.remove(old_path)
+                next_runs.append(path)
+
+            runs = next_runs
+            round_number += 1
+
+        return runs
+
+    def items(self):
+        """
+        Yields (key, state) for every key, fully merged, one partition at a time.
+        After a spill, only one state per open run file is held in memory, so
+        callers should consume the pairs as a stream rather than collect them.
+        """
+
+        if self._run_dir is None:
+            # Never spilled: everything is already in memory
+            yield from self._states.items()
+            return
+
+        # Spill the remainder too so every partition is a set of sorted runs
+        self._spill()
+
+        for index, runs in enumerate(self._runs):
+            runs = self._reduce_runs(index, runs)
+            self._runs[index] = runs
+            yield from self._merge_runs(runs)
+
+    def close(self):
+        """
+        Removes temporary spill files.
+        """
+
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+            self._runs = [[] for _ in range(self.partitions)]
+        self._states = {}
+        self._bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,203 @@
+import datetime
+
+from utils.data_processor import daily_sales_trend
+from utils.money import tx_amount_paise, divide_paise
+
+
+def _parse_day(date):
+    """
+    Parses a YYYY-MM-DD date, returning None if it is not in that format.
+    """
+
+    try:
+        return datetime.date.fromisoformat(date)
+    except (TypeError, ValueError):
+        return None
+
+
+def undated_sales(daily_stats):
+    """
+    Returns {date: revenue} for dates that are not YYYY-MM-DD.
+    These cannot be placed on the calendar, so rolling windows exclude them.
+    """
+
+    return {
+        date: stats["revenue"] if isinstance(stats, dict) else stats
+        for date, stats in daily_stats.items()
+        if _parse_day(date) is None
+    }
+
+
+def _calendar_revenue(daily_revenue):
+    """
+    Expands {date: revenue} into a gap-free list of (date, revenue) days.
+    Days without sales get 0 revenue; non-ISO dates are excluded
+    (see undated_sales()).
+    """
+
+    parsed = {}
+    for date, revenue in daily_revenue.items():
+        day = _parse_day(date)
+        if day is None:
+            continue
+        parsed[day] = parsed.get(day, 0) + revenue
+
+    if not parsed:
+        return []
+
+    first, last = min(parsed), max(parsed)
+    days = (last - first).days + 1
+
+    return [
+        (first + datetime.timedelta(days=i), parsed.get(first + datetime.timedelta(days=i), 0))
+        for i in range(days)
+    ]
+
+
+def _prefix_sums(values):
+    """
+    Returns prefix sums where prefix[i] is the sum of values[:i].
+    """
+
+    prefix = [0]
+    for value in values:
+        prefix.append(prefix[-1] + value)
+
+    return prefix
+
+
+def rolling_sales(daily_stats, window=7):
+    """
+    Computes trailing rolling revenue, moving average and day-over-day growth.
+
+    daily_stats is the output of daily_sales_trend() (or any {date: revenue}
+    dict). Every calendar day between the first and last date is included.
+    Runs in O(days) using prefix sums. Money values are integer paise.
+    """
+
+    if window < 1:
+        raise ValueError("window must be at least 1 day")
+
+    daily_revenue = {
+        date: stats["revenue"] if isinstance(stats, dict) else stats
+        for date, stats in daily_stats.items()
+    }
+    days = _calendar_revenue(daily_revenue)
+    prefix = _prefix_sums(revenue for _, revenue in days)
+
+    output = {}
+
+    for i, (day, revenue) in enumerate(days):
+        start = max(0, i + 1 - window)
+        window_total = prefix[i + 1] - prefix[start]
+
+        previous = days[i - 1][1] if i > 0 else None
+        if previous:
+            growth = (revenue - previous) / previous * 100
+        else:
+            growth = None
+
+        output[day.isoformat()] = {
+            "revenue": revenue,
+            "rolling_revenue": window_total,
+            "moving_average": divide_paise(window_total, i + 1 - start),
+            "growth_pct": growth,
+        }
+
+    return output
+
+
+def find_peak_sales_window(daily_stats, window=7):
+    """
+    Finds the window of consecutive days with the highest total revenue.
+    Generalizes find_peak_sales_day() (window=1 gives the best single day).
+
+    Returns (start_date, end_date, revenue) or None if there are no sales.
+    """
+
+    if window < 1:
+        raise ValueError("window must be at least 1 day")
+
+    daily_revenue = {
+        date: stats["revenue"] if isinstance(stats, dict) else stats
+        for date, stats in daily_stats.items()
+    }
+    days = _calendar_revenue(daily_revenue)
+
+    if not days:
+        return None
+
+    prefix = _prefix_sums(revenue for _, revenue in days)
+
+    # If there are fewer days than the window, the whole range is the window
+    span = min(window, len(days))
+
+    best_start, best_total = 0, None
+    for start in range(len(days) - span + 1):
+        total = prefix[start + span] - prefix[start]
+        if best_total is None or total > best_total:
+            best_start, best_total = start, total
+
+    return (
+        days[best_start][0].isoformat(),
+        days[best_start + span - 1][0].isoformat(),
+        best_total
+    )
+
+
+def region_daily_sales(transactions):
+    """
+    Aggregates revenue per region per date: {region: {date: revenue}}.
+    """
+
+    region_stats = {}
+
+    for tx in transactions:
+        region = tx["Region"]
+        date = tx["Date"]
+
+        if region not in region_stats:
+            region_stats[region] = {}
+
+        region_stats[region][date] = region_stats[region].get(date, 0) + tx_amount_paise(tx)
+
+    return dict(sorted(region_stats.items()))
+
+
+def region_rolling_sales(transactions, window=7):
+    """
+    Computes rolling_sales() separately for every region.
+    """
+
+    return {
+        region: rolling_sales(daily, window)
+        for region, daily in region_daily_sales(transactions).items()
+    }
+
+
+def region_peak_sales_windows(transactions, window=7):
+    """
+    Finds the peak sales window for every region.
+    Returns {region: (start_date, end_date, revenue)}.
+    """
+
+    return {
+        region: find_peak_sales_window(daily, window)
+        for region, daily in region_daily_sales(transactions).items()
+    }
+
+
+def window_analysis(transactions, window=7):
+    """
+    Convenience wrapper returning overall rolling sales, the overall peak
+    window and per-region peak windows for a list of transactions.
+    """
+
+    daily_stats = daily_sales_trend(transactions)
+
+    return {
+        "rolling_sales": rolling_sales(daily_stats, window),
+        "peak_window": find_peak_sales_window(daily_stats, window),
+        "region_peak_windows": region_peak_sales_windows(transactions, window),
+        "undated_sales": undated_sales(daily_stats),
+    }